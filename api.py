@@ -4,22 +4,40 @@ OpenAI-compatible API server for self-notes RAG system.
 Allows Open WebUI and other OpenAI-compatible clients to use the RAG pipeline.
 """
 
+import asyncio
 import time
 import uuid
 import warnings
+from contextlib import asynccontextmanager
 
+import orjson
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from src.query import query
+from src.query import query, query_stream, warmup
+from starlette.concurrency import iterate_in_threadpool
 from typing import Optional
 
 # Suppress pydantic v1 compatibility warning (langchain internal)
 warnings.filterwarnings("ignore", message=".*Pydantic V1.*")
 
 
-app = FastAPI(title="Self-Notes RAG API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Preload Ollama models so the first request sees steady-state latency
+    try:
+        await asyncio.to_thread(warmup)
+    except Exception as e:
+        print(f"Warning: Model warmup failed: {e}")
+    yield
+
+
+app = FastAPI(
+    title="Self-Notes RAG API",
+    version="1.0.0",
+    lifespan=lifespan,
+)
 
 # Allow CORS for Open WebUI
 app.add_middleware(
@@ -44,27 +62,6 @@ class ChatCompletionRequest(BaseModel):
     stream: Optional[bool] = False
 
 
-class ChatCompletionChoice(BaseModel):
-    index: int
-    message: Message
-    finish_reason: str
-
-
-class Usage(BaseModel):
-    prompt_tokens: int
-    completion_tokens: int
-    total_tokens: int
-
-
-class ChatCompletionResponse(BaseModel):
-    id: str
-    object: str
-    created: int
-    model: str
-    choices: list[ChatCompletionChoice]
-    usage: Usage
-
-
 class ModelInfo(BaseModel):
     id: str
     object: str
@@ -94,6 +91,28 @@ async def list_models():
     )
 
 
+def format_sources(sources: list[dict]) -> str:
+    """Render sources as a markdown list to append to an answer."""
+    if not sources:
+        return ""
+    lines = "".join(f"- [{src['title']}]({src['url']})\n" for src in sources)
+    return f"\n\n---\n**Sources:**\n{lines}"
+
+
+def content_event(chunk_id: str, created: int, content: str) -> str:
+    """Build an SSE event carrying a content delta."""
+    content_chunk = {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": "self-notes",
+        "choices": [
+            {"index": 0, "delta": {"content": content}, "finish_reason": None}
+        ],
+    }
+    return f"data: {orjson.dumps(content_chunk).decode()}\n\n"
+
+
 @app.post("/v1/chat/completions")
 @app.post("/chat/completions")
 async def chat_completions(request: ChatCompletionRequest):
@@ -106,19 +125,10 @@ async def chat_completions(request: ChatCompletionRequest):
     else:
         question = user_messages[-1].content
 
-    # Query the RAG system
-    result = query(question)
-    answer = result["answer"]
-
-    # Append sources if available
-    if result["sources"]:
-        answer += "\n\n---\n**Sources:**\n"
-        for src in result["sources"]:
-            answer += f"- [{src['title']}]({src['url']})\n"
-
-    # Handle streaming
+    # Handle streaming: forward LLM tokens as they are generated
     if request.stream:
-        import json
+        # Retrieval blocks on Ollama, so it runs off the event loop too
+        tokens, sources = await asyncio.to_thread(query_stream, question)
 
         async def generate():
             chunk_id = f"chatcmpl-{uuid.uuid4().hex[:8]}"
@@ -134,25 +144,14 @@ async def chat_completions(request: ChatCompletionRequest):
                     {"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}
                 ],
             }
-            yield f"data: {json.dumps(role_chunk)}\n\n"
-
-            # Stream content in smaller chunks
-            chunk_size = 20
-            for i in range(0, len(answer), chunk_size):
-                content_chunk = {
-                    "id": chunk_id,
-                    "object": "chat.completion.chunk",
-                    "created": created,
-                    "model": "self-notes",
-                    "choices": [
-                        {
-                            "index": 0,
-                            "delta": {"content": answer[i : i + chunk_size]},
-                            "finish_reason": None,
-                        }
-                    ],
-                }
-                yield f"data: {json.dumps(content_chunk)}\n\n"
+            yield f"data: {orjson.dumps(role_chunk).decode()}\n\n"
+
+            async for token in iterate_in_threadpool(tokens):
+                if token:
+                    yield content_event(chunk_id, created, token)
+
+            if sources:
+                yield content_event(chunk_id, created, format_sources(sources))
 
             # Send done chunk
             done_chunk = {
@@ -162,30 +161,37 @@ async def chat_completions(request: ChatCompletionRequest):
                 "model": "self-notes",
                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
             }
-            yield f"data: {json.dumps(done_chunk)}\n\n"
+            yield f"data: {orjson.dumps(done_chunk).decode()}\n\n"
             yield "data: [DONE]\n\n"
 
         return StreamingResponse(generate(), media_type="text/event-stream")
 
-    # Non-streaming response
-    return ChatCompletionResponse(
-        id=f"chatcmpl-{uuid.uuid4().hex[:8]}",
-        object="chat.completion",
-        created=int(time.time()),
-        model="self-notes",
-        choices=[
-            ChatCompletionChoice(
-                index=0,
-                message=Message(role="assistant", content=answer),
-                finish_reason="stop",
-            )
+    # Query the RAG system off the event loop; it blocks on Ollama for seconds
+    result = await asyncio.to_thread(query, question)
+    answer = result["answer"] + format_sources(result["sources"])
+
+    # Non-streaming response: serialized with orjson directly, skipping pydantic and jsonable_encoder
+    prompt_tokens = len(question.split())
+    completion_tokens = len(answer.split())
+    payload = {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:8]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "self-notes",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }
         ],
-        usage=Usage(
-            prompt_tokens=len(question.split()),
-            completion_tokens=len(answer.split()),
-            total_tokens=len(question.split()) + len(answer.split()),
-        ),
-    )
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+    return Response(orjson.dumps(payload), media_type="application/json")
 
 
 @app.get("/health")
@@ -0,0 +1,124 @@
+"""Caches that skip repeated Ollama work: answers for similar questions, embeddings for unchanged text."""
+import hashlib
+import numpy as np
+import threading
+from pathlib import Path
+from typing import Optional
+
+HASH_SIZE = 16
+
+
+class ProximityCache:
+    def __init__(self, capacity: int = 256, tau: float = 0.97):
+        self.capacity = capacity
+        self.tau = tau
+        self.keys: Optional[np.ndarray] = None
+        self.values: list[dict] = []
+        self.last_used: list[int] = []
+        self._tick = 0
+        # The API server queries from worker threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        vec = np.array(embedding, dtype=np.float32)
+        return vec / (np.linalg.norm(vec) + 1e-10)
+
+    def lookup(self, embedding: list[float]) -> Optional[dict]:
+        """Return the cached result whose key is closest to embedding, if within tau."""
+        query_vec = self._normalize(embedding)
+        with self._lock:
+            if not self.values:
+                return None
+
+            similarities = self.keys[:len(self.values)] @ query_vec
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.tau:
+                return None
+
+            self._tick += 1
+            self.last_used[best] = self._tick
+            return self.values[best]
+
+    def insert(self, embedding: list[float], value: dict):
+        """Cache value under embedding, evicting the least recently used entry when full."""
+        key = self._normalize(embedding)
+        with self._lock:
+            if self.keys is None:
+                self.keys = np.zeros((self.capacity, key.shape[0]), dtype=np.float32)
+
+            self._tick += 1
+            if len(self.values) < self.capacity:
+                slot = len(self.values)
+                self.values.append(value)
+                self.last_used.append(self._tick)
+            else:
+                slot = int(np.argmin(self.last_used))
+                self.values[slot] = value
+                self.last_used[slot] = self._tick
+
+            self.keys[slot] = key
+
+    def clear(self):
+        with self._lock:
+            self.keys = None
+            self.values = []
+            self.last_used = []
+
+
+class EmbeddingCache:
+    """Persistent text -> embedding cache so re-indexing only embeds new or changed chunks."""
+
+    def __init__(self, path: Path, model: str):
+        self.path = path
+        self.embeddings_file = path / "embeddings_cache.npy"
+        self.hashes_file = path / "hashes.npy"
+        self.model = model
+        self.vectors: dict[bytes, np.ndarray] = {}
+        self.hits = 0
+        self._used: set[bytes] = set()
+        self._load()
+
+    def _load(self):
+        if self.embeddings_file.exists() and self.hashes_file.exists():
+            hashes = np.load(self.hashes_file)
+            vectors = np.load(self.embeddings_file)
+            self.vectors = {h.tobytes(): v for h, v in zip(hashes, vectors)}
+
+    def _hash(self, text: str) -> bytes:
+        # Keyed by model too, so switching EMBEDDING_MODEL never reuses stale vectors
+        digest = hashlib.blake2b(self.model.encode(), digest_size=HASH_SIZE)
+        digest.update(b"\0")
+        digest.update(text.encode())
+        return digest.digest()
+
+    def embed_documents(self, embeddings, texts: list[str]) -> list[np.ndarray]:
+        """Return embeddings for texts, calling the model only for uncached ones."""
+        keys = [self._hash(text) for text in texts]
+        missing = {key: text for key, text in zip(keys, texts) if key not in self.vectors}
+        self.hits += len(texts) - len(missing)
+
+        if missing:
+            new_vectors = embeddings.embed_documents(list(missing.values()))
+            for key, vec in zip(missing, new_vectors):
+                self.vectors[key] = np.array(vec, dtype=np.float32)
+
+        self._used.update(keys)
+        return [self.vectors[key] for key in keys]
+
+    def save(self, prune: bool = True):
+        """
+        Persist the cache. With prune, only entries used since load are kept, so text
+        no longer in the workspace is dropped; pass prune=False after a partial run.
+        """
+        keys = [key for key in self.vectors if not prune or key in self._used]
+        if not keys:
+            for file in (self.embeddings_file, self.hashes_file):
+                if file.exists():
+                    file.unlink()
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        hashes = np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(-1, HASH_SIZE)
+        np.save(self.hashes_file, hashes)
+        np.save(self.embeddings_file, np.stack([self.vectors[key] for key in keys]))
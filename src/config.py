@@ -23,3 +23,8 @@ LLM_MODEL = "mistral"
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 TOP_K_RESULTS = 4
+EMBEDDING_BATCH_SIZE = 128
+
+# Query cache: reuse answers for questions whose embeddings have cosine similarity >= tau
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_TAU = 0.97
@@ -1,7 +1,8 @@
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_ollama import OllamaEmbeddings
 
-from src.config import DB_DIR, EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP
+from src.cache import EmbeddingCache
+from src.config import DB_DIR, EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_BATCH_SIZE
 from src.notion import get_client, fetch_root_pages
 from src.vectorstore import VectorStore
 
@@ -10,8 +11,29 @@ def get_vectorstore():
     return VectorStore(DB_DIR)
 
 
-def get_embeddings():
-    return OllamaEmbeddings(model=EMBEDDING_MODEL)
+_embeddings = None
+
+
+def get_embeddings() -> OllamaEmbeddings:
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    return _embeddings
+
+
+def _embed_and_store(
+    store: VectorStore,
+    cache: EmbeddingCache,
+    embeddings,
+    chunks: list[str],
+    metadatas: list[dict]
+):
+    """Embed a batch of chunks (uncached ones in a single Ollama call) and add them to the store."""
+    store.add(
+        embeddings=cache.embed_documents(embeddings, chunks),
+        documents=chunks,
+        metadatas=metadatas
+    )
 
 
 def index_all_pages(verbose: bool = True) -> int:
@@ -22,6 +44,7 @@ def index_all_pages(verbose: bool = True) -> int:
     notion = get_client()
     store = get_vectorstore()
     embeddings = get_embeddings()
+    cache = EmbeddingCache(DB_DIR, EMBEDDING_MODEL)
 
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
@@ -29,50 +52,68 @@ def index_all_pages(verbose: bool = True) -> int:
         separators=["\n\n", "\n", ". ", " ", ""]
     )
 
-    # Clear existing data for fresh index
+    # Rebuild from scratch in memory; the old index stays on disk (and queryable)
+    # until save() replaces it, so a failed run leaves it intact
     existing_count = store.count()
     if existing_count > 0:
-        store.clear()
+        store.reset()
         if verbose:
-            print(f"Cleared {existing_count} existing chunks")
+            print(f"Replacing {existing_count} existing chunks")
 
     total_chunks = 0
 
-    for page in fetch_root_pages(notion):
-        if verbose:
-            print(f"Indexing: {page['title']}")
-
-        chunks = splitter.split_text(page["content"])
-
-        if not chunks:
-            continue
-
-        # Generate embeddings
-        chunk_embeddings = embeddings.embed_documents(chunks)
-
-        # Create metadata for each chunk
-        metadatas = [
-            {
-                "page_id": page["id"],
-                "title": page["title"],
-                "url": page["url"],
-                "last_edited": page["last_edited"],
-                "chunk_index": i
-            }
-            for i in range(len(chunks))
-        ]
-
-        # Add to store
-        store.add(
-            embeddings=chunk_embeddings,
-            documents=chunks,
-            metadatas=metadatas
-        )
-
-        total_chunks += len(chunks)
+    # Chunks are buffered across pages so each embedding request carries a full batch
+    pending_chunks = []
+    pending_metadatas = []
+
+    # Embeddings computed before a failure are kept, so a retry doesn't recompute them
+    completed = False
+    try:
+        for page in fetch_root_pages(notion):
+            if verbose:
+                print(f"Indexing: {page['title']}")
+
+            chunks = splitter.split_text(page["content"])
+
+            if not chunks:
+                continue
+
+            # Create metadata for each chunk
+            pending_metadatas.extend(
+                {
+                    "page_id": page["id"],
+                    "title": page["title"],
+                    "url": page["url"],
+                    "last_edited": page["last_edited"],
+                    "chunk_index": i
+                }
+                for i in range(len(chunks))
+            )
+            pending_chunks.extend(chunks)
+
+            while len(pending_chunks) >= EMBEDDING_BATCH_SIZE:
+                _embed_and_store(
+                    store,
+                    cache,
+                    embeddings,
+                    pending_chunks[:EMBEDDING_BATCH_SIZE],
+                    pending_metadatas[:EMBEDDING_BATCH_SIZE]
+                )
+                del pending_chunks[:EMBEDDING_BATCH_SIZE]
+                del pending_metadatas[:EMBEDDING_BATCH_SIZE]
+
+            total_chunks += len(chunks)
+
+        if pending_chunks:
+            _embed_and_store(store, cache, embeddings, pending_chunks, pending_metadatas)
+
+        store.save()
+        completed = True
+    finally:
+        cache.save(prune=completed)
 
     if verbose:
-        print(f"\nIndexed {total_chunks} chunks total")
+        print(f"\nIndexed {total_chunks} chunks total ({cache.hits} embeddings reused from cache)")
 
     return total_chunks
 
@@ -80,20 +121,18 @@ def index_all_pages(verbose: bool = True) -> int:
 def get_indexed_sources() -> list[dict]:
     """Get list of all indexed pages with metadata."""
     store = get_vectorstore()
-    all_metadata = store.get_all_metadata()
-
-    if not all_metadata:
-        return []
 
-    # Deduplicate by page_id
-    pages = {}
-    for meta in all_metadata:
+    # Deduplicate by page_id in a single pass over the stored metadata
+    seen_ids = set()
+    sources = []
+    for meta in store.get_all_metadata():
         page_id = meta["page_id"]
-        if page_id not in pages:
-            pages[page_id] = {
+        if page_id not in seen_ids:
+            seen_ids.add(page_id)
+            sources.append({
                 "title": meta["title"],
                 "url": meta["url"],
                 "last_edited": meta["last_edited"]
-            }
+            })
 
-    return list(pages.values())
+    return sources
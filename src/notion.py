@@ -1,33 +1,98 @@
+import asyncio
+import queue
 import re
-from notion_client import Client
-from typing import Generator
+import threading
+from notion_client import APIErrorCode, APIResponseError, AsyncClient
+from typing import Awaitable, Callable, Generator
 from src.config import NOTION_API_KEY, ROOT_PAGES
 
+# Notion rate-limits integrations to an average of 3 requests per second, allowing short bursts
+REQUESTS_PER_SECOND = 3
+REQUEST_BURST = 10
+MAX_RETRIES = 4
 
-def get_client() -> Client:
+_UUID_RE = re.compile(r'^[a-f0-9]{32,36}$')
+_HEX32_END_RE = re.compile(r'([a-f0-9]{32})(?:\?|$)')
+_HEX32_DASH_RE = re.compile(r'-([a-f0-9]{32})(?:\?|$)')
+_HEX_CHAR_RE = re.compile(r'[a-f0-9]')
+
+
+def get_client() -> AsyncClient:
     if not NOTION_API_KEY:
         raise ValueError("NOTION_API_KEY not set. Add it to your .env file.")
-    return Client(auth=NOTION_API_KEY)
+    return AsyncClient(auth=NOTION_API_KEY)
+
+
+class Throttle:
+    """
+    Token bucket: up to `burst` requests start at once, then `rate` per second.
+    Callers sleep without holding a lock, so throttled requests still overlap in flight.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated: float | None = None
+
+    def _refill(self):
+        now = asyncio.get_running_loop().time()
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def wait(self):
+        # No await between refill and reservation, so concurrent callers each take their own token
+        self._refill()
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+    def pause(self, seconds: float):
+        """Hold back every caller for `seconds`, e.g. after Notion answered rate_limited."""
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+def _retry_after(error: APIResponseError, attempt: int) -> float:
+    try:
+        return float(error.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return 2 ** attempt
+
+
+async def _request(throttle: Throttle, method: Callable[..., Awaitable[dict]], **kwargs) -> dict:
+    """Call a Notion API method under the throttle, honoring Retry-After when rate limited."""
+    for attempt in range(MAX_RETRIES + 1):
+        await throttle.wait()
+        try:
+            return await method(**kwargs)
+        except APIResponseError as e:
+            if e.code != APIErrorCode.RateLimited or attempt == MAX_RETRIES:
+                raise
+            delay = _retry_after(e, attempt)
+            throttle.pause(delay)
+            await asyncio.sleep(delay)
 
 
 def parse_page_id(url_or_id: str) -> str:
     """Extract page ID from a Notion URL or return as-is if already an ID."""
     # Already a UUID-like ID
-    if re.match(r'^[a-f0-9-]{32,36}$', url_or_id.replace('-', '')):
+    if _UUID_RE.match(url_or_id.replace('-', '')):
         return url_or_id.replace('-', '')
 
     # Extract from URL: notion.so/Page-Title-abc123 or notion.so/workspace/abc123
-    match = re.search(r'([a-f0-9]{32})(?:\?|$)', url_or_id)
+    match = _HEX32_END_RE.search(url_or_id)
     if match:
         return match.group(1)
 
     # Try extracting the last segment after the last dash
-    match = re.search(r'-([a-f0-9]{32})(?:\?|$)', url_or_id)
+    match = _HEX32_DASH_RE.search(url_or_id)
     if match:
         return match.group(1)
 
     # Last resort: take the last 32 hex chars
-    hex_chars = re.findall(r'[a-f0-9]', url_or_id.lower())
+    hex_chars = _HEX_CHAR_RE.findall(url_or_id.lower())
     if len(hex_chars) >= 32:
         return ''.join(hex_chars[-32:])
 
@@ -61,16 +126,25 @@ def extract_text_from_block(block: dict) -> str:
     return ""
 
 
-def get_page_content_and_children(client: Client, page_id: str) -> tuple[str, list[str]]:
+async def get_page_content_and_children(
+    client: AsyncClient,
+    page_id: str,
+    throttle: Throttle
+) -> tuple[list[str], list[str]]:
     """
-    Get text content from a page and collect child page IDs.
-    Returns (content_text, list_of_child_page_ids)
+    Get text fragments from a page and collect child page IDs.
+    Nested blocks are fetched concurrently, paced by throttle; a nested block that
+    fails to load is skipped without losing the rest of the page.
+    Fragments are flattened across nesting levels so the caller joins them once.
+    Returns (list_of_text_fragments, list_of_child_page_ids)
     """
     blocks = []
     cursor = None
 
     while True:
-        response = client.blocks.children.list(
+        response = await _request(
+            throttle,
+            client.blocks.children.list,
             block_id=page_id,
             start_cursor=cursor
         )
@@ -80,6 +154,22 @@ def get_page_content_and_children(client: Client, page_id: str) -> tuple[str, li
             break
         cursor = response.get("next_cursor")
 
+    # Fetch nested blocks (toggles, callouts, etc.) but not child_pages, all at once
+    nested_ids = [
+        block["id"] for block in blocks
+        if block.get("has_children") and block.get("type") not in ["child_page", "child_database"]
+    ]
+    nested_results = await asyncio.gather(
+        *(get_page_content_and_children(client, block_id, throttle) for block_id in nested_ids),
+        return_exceptions=True
+    )
+    nested = {}
+    for block_id, result in zip(nested_ids, nested_results):
+        if isinstance(result, Exception):
+            print(f"  Warning: Could not fetch nested blocks of {block_id}: {result}")
+            continue
+        nested[block_id] = result
+
     texts = []
     child_page_ids = []
 
@@ -99,14 +189,12 @@ def get_page_content_and_children(client: Client, page_id: str) -> tuple[str, li
         if text:
             texts.append(text)
 
-        # Handle nested blocks (toggles, callouts, etc.) but not child_pages
-        if block.get("has_children") and block_type not in ["child_page", "child_database"]:
-            nested_content, nested_children = get_page_content_and_children(client, block["id"])
-            if nested_content:
-                texts.append(nested_content)
+        if block["id"] in nested:
+            nested_texts, nested_children = nested[block["id"]]
+            texts.extend(nested_texts)
             child_page_ids.extend(nested_children)
 
-    return "\n".join(texts), child_page_ids
+    return texts, child_page_ids
 
 
 def get_page_title(page: dict) -> str:
@@ -137,12 +225,18 @@ def get_page_url(page: dict) -> str:
     return page.get("url", "")
 
 
-def fetch_page_recursive(
-    client: Client,
+async def fetch_page_recursive(
+    client: AsyncClient,
     page_id: str,
-    visited: set[str]
-) -> Generator[dict, None, None]:
-    """Fetch a page and all its child pages recursively."""
+    visited: set[str],
+    throttle: Throttle,
+    emit: Callable[[dict], None]
+):
+    """
+    Fetch a page and all its child pages recursively, fanning out over children.
+    Each page is passed to emit as soon as its content is fetched.
+    Errors are contained per page, so one failing page never drops its siblings.
+    """
     # Normalize ID
     normalized_id = page_id.replace('-', '')
 
@@ -152,7 +246,7 @@ def fetch_page_recursive(
 
     # Fetch page metadata
     try:
-        page = client.pages.retrieve(page_id=page_id)
+        page = await _request(throttle, client.pages.retrieve, page_id=page_id)
     except Exception as e:
         print(f"  Warning: Could not fetch page {page_id}: {e}")
         return
@@ -161,35 +255,69 @@ def fetch_page_recursive(
     url = get_page_url(page)
     last_edited = page.get("last_edited_time", "")
 
-    # Get content and find child pages
-    content, child_page_ids = get_page_content_and_children(client, page_id)
+    # Get content and find child pages; a failure skips only this page's subtree
+    try:
+        texts, child_page_ids = await get_page_content_and_children(client, page_id, throttle)
+    except Exception as e:
+        print(f"  Warning: Could not fetch content of page {page_id}: {e}")
+        return
+    content = "\n".join(texts)
 
     if content.strip():
-        yield {
+        emit({
             "id": page_id,
             "title": title,
             "url": url,
             "last_edited": last_edited,
             "content": content
-        }
+        })
 
     # Recursively fetch child pages
-    for child_id in child_page_ids:
-        yield from fetch_page_recursive(client, child_id, visited)
+    await asyncio.gather(
+        *(fetch_page_recursive(client, child_id, visited, throttle, emit) for child_id in child_page_ids)
+    )
+
+
+async def _fetch_root_pages(client: AsyncClient, emit: Callable[[dict], None]):
+    visited = set()
+    throttle = Throttle(REQUESTS_PER_SECOND, REQUEST_BURST)
+
+    async def fetch_root(url_or_id: str):
+        try:
+            page_id = parse_page_id(url_or_id)
+            await fetch_page_recursive(client, page_id, visited, throttle, emit)
+        except Exception as e:
+            print(f"  Warning: Failed to process {url_or_id}: {e}")
+
+    async with client:
+        await asyncio.gather(*(fetch_root(url_or_id) for url_or_id in ROOT_PAGES))
 
 
-def fetch_root_pages(client: Client) -> Generator[dict, None, None]:
-    """Fetch all configured root pages and their children recursively."""
+def fetch_root_pages(client: AsyncClient) -> Generator[dict, None, None]:
+    """
+    Fetch all configured root pages and their children recursively.
+    The crawl runs on a background thread; pages are yielded as soon as each is fetched.
+    """
     if not ROOT_PAGES:
         raise ValueError(
             "No root pages configured. Add page URLs to ROOT_PAGES in src/config.py"
         )
 
-    visited = set()
+    pages = queue.Queue()
+    errors = []
 
-    for url_or_id in ROOT_PAGES:
+    def crawl():
         try:
-            page_id = parse_page_id(url_or_id)
-            yield from fetch_page_recursive(client, page_id, visited)
+            asyncio.run(_fetch_root_pages(client, pages.put))
         except Exception as e:
-            print(f"  Warning: Failed to process {url_or_id}: {e}")
+            errors.append(e)
+        finally:
+            pages.put(None)
+
+    threading.Thread(target=crawl, daemon=True).start()
+
+    while (page := pages.get()) is not None:
+        yield page
+
+    if errors:
+        raise errors[0]
@@ -1,43 +1,102 @@
-from langchain_ollama import OllamaEmbeddings, OllamaLLM
+from typing import Iterator
 
-from src.config import DB_DIR, EMBEDDING_MODEL, LLM_MODEL, TOP_K_RESULTS
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+
+from src.cache import ProximityCache
+from src.config import (
+    DB_DIR, EMBEDDING_MODEL, LLM_MODEL, TOP_K_RESULTS, QUERY_CACHE_SIZE, QUERY_CACHE_TAU
+)
 from src.vectorstore import VectorStore
 
 
+# Kept byte-identical across calls so Ollama can reuse the prompt prefix's KV cache
 SYSTEM_PROMPT = """You are a helpful assistant that answers questions based ONLY on the provided notes.
 
 Rules:
-1. Answer ONLY using information from the notes below
+1. Answer ONLY using information from the notes in the user's message
 2. If the answer is not in the notes, say "I don't have information about that in my notes"
 3. Be concise and direct
-4. When relevant, mention which note the information came from
+4. When relevant, mention which note the information came from"""
 
-Notes:
+USER_PROMPT = """Notes:
 {context}
 
-Question: {question}
+Question: {question}"""
 
-Answer:"""
+_cache = ProximityCache(capacity=QUERY_CACHE_SIZE, tau=QUERY_CACHE_TAU)
 
+# Created on first use and shared across queries. Each wraps an ollama client that owns a
+# pooled httpx.Client, so reusing the instance reuses its keep-alive connections
+_embeddings = None
+_llm = None
+_store = None
 
-def query(question: str, verbose: bool = False) -> dict:
+
+def _get_embeddings() -> OllamaEmbeddings:
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    return _embeddings
+
+
+def _get_llm() -> ChatOllama:
+    global _llm
+    if _llm is None:
+        _llm = ChatOllama(model=LLM_MODEL)
+    return _llm
+
+
+def _get_store() -> VectorStore:
+    # Loading parses every file in the store (including the HNSW index), so it is done once
+    # per process and repeated only when a re-index rewrites the files
+    global _store
+    if _store is None or _store.is_stale():
+        _store = VectorStore(DB_DIR)
+        # Cached answers and sources were built from the previous index
+        _cache.clear()
+    return _store
+
+
+def _cache_result(prepared: dict, result: dict):
+    # Skip answers built from a store that was replaced while the LLM was generating
+    if prepared["store"] is _store:
+        _cache.insert(prepared["embedding"], result)
+
+
+def warmup():
+    """Load the store and the Ollama models so the first query isn't slowed by it."""
+    _get_store()
+    _get_embeddings().embed_query("warmup")
+    # A one-token generation is enough to make Ollama load the model
+    _get_llm().invoke("warmup", options={"num_predict": 1})
+
+
+def _prepare(question: str, verbose: bool = False) -> dict:
     """
-    Query the indexed notes and return an answer with sources.
+    Embed the question and retrieve context for it.
 
     Returns:
-        dict with 'answer' and 'sources' keys
+        dict with a final 'result' when no LLM call is needed (empty index, cache hit,
+        nothing relevant), otherwise 'store', 'embedding', 'messages' and 'sources' keys
     """
-    store = VectorStore(DB_DIR)
+    store = _get_store()
 
     if store.count() == 0:
-        return {
+        return {"result": {
             "answer": "No notes indexed yet. Run 'python cli.py index' first.",
             "sources": []
-        }
+        }}
 
     # Generate embedding for the question
-    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
-    question_embedding = embeddings.embed_query(question)
+    question_embedding = _get_embeddings().embed_query(question)
+
+    # Near-duplicate questions skip retrieval and the LLM call entirely
+    cached = _cache.lookup(question_embedding)
+    if cached is not None:
+        if verbose:
+            print("Answer served from query cache\n")
+        return {"result": cached}
 
     # Search for relevant chunks
     results = store.query(
@@ -46,10 +105,10 @@ def query(question: str, verbose: bool = False) -> dict:
     )
 
     if not results["documents"][0]:
-        return {
+        return {"result": {
             "answer": "No relevant notes found.",
             "sources": []
-        }
+        }}
 
     # Build context from retrieved chunks
     chunks = results["documents"][0]
@@ -74,12 +133,66 @@ def query(question: str, verbose: bool = False) -> dict:
     if verbose:
         print(f"Found {len(chunks)} relevant chunks from {len(sources)} pages\n")
 
-    # Generate answer with LLM
-    llm = OllamaLLM(model=LLM_MODEL)
-    prompt = SYSTEM_PROMPT.format(context=context, question=question)
-    answer = llm.invoke(prompt)
+    messages = [
+        SystemMessage(content=SYSTEM_PROMPT),
+        HumanMessage(content=USER_PROMPT.format(context=context, question=question)),
+    ]
 
     return {
-        "answer": answer,
+        "store": store,
+        "embedding": question_embedding,
+        "messages": messages,
         "sources": sources
     }
+
+
+def query(question: str, verbose: bool = False) -> dict:
+    """
+    Query the indexed notes and return an answer with sources.
+
+    Returns:
+        dict with 'answer' and 'sources' keys
+    """
+    prepared = _prepare(question, verbose)
+    if "result" in prepared:
+        return prepared["result"]
+
+    # Generate answer with LLM
+    answer = _get_llm().invoke(prepared["messages"]).content
+
+    result = {
+        "answer": answer,
+        "sources": prepared["sources"]
+    }
+    _cache_result(prepared, result)
+
+    return result
+
+
+def _stream_answer(prepared: dict) -> Iterator[str]:
+    tokens = []
+    for chunk in _get_llm().stream(prepared["messages"]):
+        tokens.append(chunk.content)
+        yield chunk.content
+
+    # Only fully generated answers are cached; an abandoned stream never gets here
+    _cache_result(prepared, {
+        "answer": "".join(tokens),
+        "sources": prepared["sources"]
+    })
+
+
+def query_stream(question: str) -> tuple[Iterator[str], list[dict]]:
+    """
+    Query the indexed notes, streaming the answer as the LLM generates it.
+    Retrieval runs eagerly; the LLM is only called as the iterator is consumed.
+
+    Returns:
+        (iterator of answer tokens, sources)
+    """
+    prepared = _prepare(question)
+    if "result" in prepared:
+        result = prepared["result"]
+        return iter([result["answer"]]), result["sources"]
+
+    return _stream_answer(prepared), prepared["sources"]
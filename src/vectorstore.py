@@ -1,76 +1,204 @@
-"""Simple file-based vector store using numpy. No external vector DB dependencies."""
-import json
+"""Simple file-based vector store using numpy, with an HNSW index for large corpora."""
+import hnswlib
 import numpy as np
+import orjson
+import os
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional
 
+# Below this many chunks an exact scan is fast enough and needs no index
+ANN_THRESHOLD = 50_000
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# Rows dequantized to float32 at a time during exact search (~12 MB at 768 dims)
+SCORE_BLOCK_ROWS = 4096
+
 
 class VectorStore:
     def __init__(self, path: Path):
         self.path = path
-        self.embeddings_file = path / "embeddings.npy"
+        self.embeddings_file = path / "embeddings_q.npy"
+        self.scales_file = path / "scales.npy"
         self.metadata_file = path / "metadata.json"
+        self.documents_file = path / "documents.json"
+        self.index_file = path / "hnsw.bin"
+        self._files = (
+            self.embeddings_file, self.scales_file, self.metadata_file, self.documents_file, self.index_file
+        )
+        # Embeddings are stored as int8 with a float32 scale per row
         self.embeddings: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        # Parallel lists: documents[i] is the text of the chunk described by metadata[i]
+        self.documents: list[str] = []
         self.metadata: list[dict] = []
+        self.index: Optional[hnswlib.Index] = None
+        # Batches from add() are concatenated once, on save() or the next query()
+        self._pending_embeddings: list[np.ndarray] = []
+        self._pending_scales: list[np.ndarray] = []
+        self._disk_stamp = self._stamp()
         self._load()
 
-    def _load(self):
-        if self.embeddings_file.exists() and self.metadata_file.exists():
-            self.embeddings = np.load(self.embeddings_file)
-            with open(self.metadata_file) as f:
-                self.metadata = json.load(f)
+    def _stamp(self) -> tuple:
+        stamp = []
+        for file in self._files:
+            try:
+                stat = file.stat()
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def is_stale(self) -> bool:
+        """Whether the files on disk changed since this store loaded or saved them."""
+        return self._stamp() != self._disk_stamp
 
-    def _save(self):
+    def _load(self):
+        files = (self.embeddings_file, self.scales_file, self.metadata_file, self.documents_file)
+        if all(file.exists() for file in files):
+            # Memory-mapped so startup doesn't read the whole matrix; the OS pages it in on query
+            self.embeddings = np.load(self.embeddings_file, mmap_mode="r")
+            self.scales = np.load(self.scales_file)
+            with open(self.metadata_file, "rb") as f:
+                self.metadata = orjson.loads(f.read())
+            with open(self.documents_file, "rb") as f:
+                self.documents = orjson.loads(f.read())
+            if not len(self.embeddings) == len(self.documents) == len(self.metadata):
+                # Caught mid-save; is_stale() turns true once the save finishes
+                self.reset()
+                return
+            if self.index_file.exists():
+                self.index = hnswlib.Index(space="cosine", dim=self.embeddings.shape[1])
+                self.index.load_index(str(self.index_file), max_elements=len(self.metadata))
+
+    def _consolidate(self):
+        if not self._pending_embeddings:
+            return
+        if self.embeddings is not None:
+            self._pending_embeddings.insert(0, self.embeddings)
+            self._pending_scales.insert(0, self.scales)
+        self.embeddings = np.concatenate(self._pending_embeddings)
+        self.scales = np.concatenate(self._pending_scales)
+        self._pending_embeddings = []
+        self._pending_scales = []
+
+    @staticmethod
+    @contextmanager
+    def _atomic_write(file: Path):
+        # Write to a sibling temp file and swap it in, so a concurrent reader never sees half a file
+        tmp = file.with_name(file.name + ".tmp")
+        with open(tmp, "wb") as f:
+            yield f
+        os.replace(tmp, file)
+
+    def save(self):
+        """Write embeddings and metadata to disk. Call once after a batch of add()s."""
+        self._consolidate()
+        if isinstance(self.embeddings, np.memmap):
+            # Keep the data readable once the mapped file is replaced
+            self.embeddings = np.array(self.embeddings)
         self.path.mkdir(parents=True, exist_ok=True)
+
         if self.embeddings is not None:
-            np.save(self.embeddings_file, self.embeddings)
-        with open(self.metadata_file, "w") as f:
-            json.dump(self.metadata, f)
+            with self._atomic_write(self.embeddings_file) as f:
+                np.save(f, self.embeddings)
+            with self._atomic_write(self.scales_file) as f:
+                np.save(f, self.scales)
+            if self.index is None and self.count() >= ANN_THRESHOLD:
+                self._build_index()
+        else:
+            self._unlink(self.embeddings_file, self.scales_file)
 
-    def clear(self):
+        if self.index is not None:
+            tmp = self.index_file.with_name(self.index_file.name + ".tmp")
+            self.index.save_index(str(tmp))
+            os.replace(tmp, self.index_file)
+        else:
+            # A smaller re-index must not leave the previous run's index behind
+            self._unlink(self.index_file)
+
+        # Metadata goes last: it is what marks the new store as complete
+        with self._atomic_write(self.documents_file) as f:
+            f.write(orjson.dumps(self.documents))
+        with self._atomic_write(self.metadata_file) as f:
+            f.write(orjson.dumps(self.metadata))
+        self._disk_stamp = self._stamp()
+
+    def _build_index(self):
+        vectors = self.embeddings * self.scales[:, None]
+        self.index = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+        self.index.init_index(
+            max_elements=len(vectors), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M
+        )
+        self.index.add_items(vectors, np.arange(len(vectors)))
+
+    @staticmethod
+    def _unlink(*files: Path):
+        for file in files:
+            if file.exists():
+                file.unlink()
+
+    def reset(self):
+        """Empty the store in memory only; the files on disk stay until the next save()."""
         self.embeddings = None
+        self.scales = None
+        self.documents = []
         self.metadata = []
-        if self.embeddings_file.exists():
-            self.embeddings_file.unlink()
-        if self.metadata_file.exists():
-            self.metadata_file.unlink()
+        self.index = None
+        self._pending_embeddings = []
+        self._pending_scales = []
 
-    def add(self, embeddings: list[list[float]], documents: list[str], metadatas: list[dict]):
-        new_embeddings = np.array(embeddings, dtype=np.float32)
+    def clear(self):
+        """Empty the store and delete its files."""
+        self.reset()
+        self._unlink(*self._files)
+        self._disk_stamp = self._stamp()
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        # Unit-length rows let query() compute cosine similarity as a single dot product
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / (norms + 1e-10)).astype(np.float32)
+
+    @staticmethod
+    def _quantize(embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Symmetric per-row int8 quantization: row ~= quantized * scale
+        scales = np.abs(embeddings).max(axis=-1, keepdims=True) / 127 + 1e-10
+        quantized = np.round(embeddings / scales).astype(np.int8)
+        return quantized, scales.squeeze(-1).astype(np.float32)
 
-        # Combine metadata with document text
-        new_metadata = []
-        for doc, meta in zip(documents, metadatas):
-            entry = {**meta, "document": doc}
-            new_metadata.append(entry)
+    def add(self, embeddings: list[list[float]], documents: list[str], metadatas: list[dict]):
+        normalized = self._normalize(np.array(embeddings, dtype=np.float32))
+        new_embeddings, new_scales = self._quantize(normalized)
 
-        if self.embeddings is None:
-            self.embeddings = new_embeddings
-            self.metadata = new_metadata
-        else:
-            self.embeddings = np.vstack([self.embeddings, new_embeddings])
-            self.metadata.extend(new_metadata)
+        if self.index is not None:
+            start = self.count()
+            self.index.resize_index(start + len(normalized))
+            self.index.add_items(normalized, np.arange(start, start + len(normalized)))
 
-        self._save()
+        self._pending_embeddings.append(new_embeddings)
+        self._pending_scales.append(new_scales)
+        self.documents.extend(documents)
+        self.metadata.extend(metadatas)
 
     def query(self, query_embedding: list[float], n_results: int = 4) -> dict:
-        if self.embeddings is None or len(self.metadata) == 0:
+        self._consolidate()
+        if self.embeddings is None or len(self.metadata) == 0 or n_results <= 0:
             return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
 
         query_vec = np.array(query_embedding, dtype=np.float32)
-
-        # Cosine similarity
-        norms = np.linalg.norm(self.embeddings, axis=1)
-        query_norm = np.linalg.norm(query_vec)
-        similarities = np.dot(self.embeddings, query_vec) / (norms * query_norm + 1e-10)
-
-        # Get top k indices
+        query_vec /= np.linalg.norm(query_vec) + 1e-10
         k = min(n_results, len(self.metadata))
-        top_indices = np.argsort(similarities)[-k:][::-1]
 
-        documents = [self.metadata[i]["document"] for i in top_indices]
-        metadatas = [{k: v for k, v in self.metadata[i].items() if k != "document"} for i in top_indices]
-        distances = [1 - similarities[i] for i in top_indices]  # Convert similarity to distance
+        if self.index is not None:
+            top_indices, similarities = self._ann_search(query_vec, k)
+        else:
+            top_indices, similarities = self._exact_search(query_vec, k)
+
+        documents = [self.documents[i] for i in top_indices]
+        metadatas = [self.metadata[i] for i in top_indices]
+        distances = [1 - float(sim) for sim in similarities]  # Convert similarity to distance
 
         return {
             "documents": [documents],
@@ -78,8 +206,31 @@ class VectorStore:
             "distances": [distances]
         }
 
+    def _ann_search(self, query_vec: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        self.index.set_ef(max(HNSW_EF_SEARCH, k))
+        labels, distances = self.index.knn_query(query_vec, k=k)
+        return labels[0], 1 - distances[0]
+
+    def _exact_search(self, query_vec: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        # Cosine similarity (stored embeddings are already unit-length).
+        # NumPy has no integer BLAS, so score in float32 one block of rows at a time:
+        # each block goes through sgemv and the temporary stays bounded.
+        similarities = np.empty(len(self.embeddings), dtype=np.float32)
+        for start in range(0, len(self.embeddings), SCORE_BLOCK_ROWS):
+            block = self.embeddings[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            similarities[start:start + SCORE_BLOCK_ROWS] = block @ query_vec
+        similarities *= self.scales
+
+        # Get top k indices: partition in O(N), then sort only the k winners
+        if k < len(similarities):
+            top_k = np.argpartition(similarities, -k)[-k:]
+        else:
+            top_k = np.arange(len(similarities))
+        top_indices = top_k[np.argsort(similarities[top_k])[::-1]]
+        return top_indices, similarities[top_indices]
+
     def get_all_metadata(self) -> list[dict]:
-        return [{k: v for k, v in m.items() if k != "document"} for m in self.metadata]
+        return self.metadata
 
     def count(self) -> int:
         return len(self.metadata)